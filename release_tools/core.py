@@ -1,9 +1,21 @@
-import csv
+import bisect
 import logging
 import plistlib
+import re
 from abc import ABCMeta
 from collections import namedtuple
-from os import path, getcwd
+from functools import cached_property, lru_cache
+from os import path, getcwd, getenv, stat
+from github import Github
+from github.Repository import Repository
+
+# lxml is optional. it parses the plist files with libxml2, which is quite a bit faster than the
+# pure python parser that plistlib uses. if it isn't installed, we just fall back to plistlib.
+#
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
 
 # probably better to parse these from the github repo vs local repo in the future
 #
@@ -27,10 +39,67 @@ class TaskState:
             self,
             root_logger: logging.Logger,
             current_release: Release,
-            available_releases: dict[str ,str]):
+            available_releases: dict[str ,str],
+            current_plist: dict = None):
         self.root_logger = root_logger
         self.current_release = current_release
         self.available_releases = available_releases
+        self.current_plist = current_plist if current_plist is not None else get_current_plist()
+
+        # available releases are sorted once up front so that finding the next/previous release
+        # is a binary search instead of comparing every pair of versions. the keys are kept in a
+        # separate list because bisect only supports key functions in python 3.10+.
+        #
+        self._sorted_releases = sorted(available_releases, key=_semver_key)
+        self._sorted_keys = [_semver_key(version) for version in self._sorted_releases]
+
+    @cached_property
+    def github(self) -> Github:
+        """Returns the Github client shared by all tasks.
+
+        The client is created the first time it is used so that tasks which don't talk to Github
+        can run without an access token.
+        """
+        access_token = getenv("GITHUB_ACCESS_TOKEN")
+        if access_token is None:
+            raise RuntimeError(
+                "you must create an access token and assign it to the the GITHUB_ACCESS_TOKEN "\
+                "environment variable")
+
+        return Github(access_token)
+
+    @cached_property
+    def repo(self) -> Repository:
+        """Returns a handle to the release repository shared by all tasks.
+
+        The handle is lazy, so it doesn't make a request to Github until one of its attributes is
+        used. The tasks only call methods like get_branch and update_file, which build their urls
+        from the repository name and don't need the repository's details to be fetched first.
+        """
+        return self.github.get_repo(REPOSITORY_NAME, lazy=True)
+
+    def graphql(self, query: str, variables: dict) -> dict:
+        """Runs a graphql query against the release repository and returns the repository node.
+
+        The owner and name of the release repository are passed to the query as the $owner and
+        $name variables, so the query must declare both. Raises an error if github doesn't return
+        the repository, ie: because the query was invalid.
+        """
+        owner, name = REPOSITORY_NAME.split("/")
+
+        _, response = self.github.requester.requestJsonAndCheck(
+            "POST",
+            "/graphql",
+            input={
+                "query": query,
+                "variables": {"owner": owner, "name": name, **variables}
+            })
+
+        repository = (response.get("data") or {}).get("repository")
+        if repository is None:
+            raise RuntimeError(f"graphql query against {REPOSITORY_NAME} failed: {response.get('errors')}")
+
+        return repository
 
     def next_release(self) -> Release:
         """Returns the next release.
@@ -50,17 +119,14 @@ class TaskState:
                 f"current version {cur_version} appears in the list of available releases, but "\
                 f"has a different name: {self.available_releases[cur_version]}")
 
-        next_version = None
-        for version, version_name in self.available_releases.items():
-            if semver_compare(version, cur_version) == 1:
-                if next_version is None or semver_compare(version, next_version) == -1:
-                    next_version = version
+        index = bisect.bisect_right(self._sorted_keys, _semver_key(cur_version))
 
-        if next_version is None:
+        if index == len(self._sorted_releases):
             raise RuntimeError(
                 f"can't determine next version: no version after {cur_version} is available in "\
                 f"the available releases file")
 
+        next_version = self._sorted_releases[index]
         return Release(next_version, self.available_releases[next_version])
 
     def previous_release(self) -> Release:
@@ -81,17 +147,14 @@ class TaskState:
                 f"current version {cur_version} appears in the list of available releases, but "\
                 f"has a different name: {self.available_releases[cur_version]}")
 
-        prev_version = None
-        for version, version_name in self.available_releases.items():
-            if semver_compare(version, cur_version) == -1:
-                if prev_version is None or semver_compare(version, prev_version) == 1:
-                    prev_version = version
+        index = bisect.bisect_left(self._sorted_keys, _semver_key(cur_version)) - 1
 
-        if prev_version is None:
+        if index < 0:
             raise RuntimeError(
                 f"can't determine previous version: no version before {cur_version} is available "\
                 f"in the available releases file")
 
+        prev_version = self._sorted_releases[index]
         return Release(prev_version, self.available_releases[prev_version])
 
 
@@ -112,17 +175,21 @@ class Task(metaclass=ABCMeta):
 
     See https://docs.python.org/3/library/abc.html for more information.
     """
+    REQUIRED_FUNCTIONS = frozenset([
+        "run"])
+
     @classmethod
     def __subclasshook__(cls, subclass):
-        required_functions = set([
-            "run"])
-        
         # __mro__ is the chain of derived classes for a subclass.
         #
-        # we check here to see if any definition has all of the required methods by comparing each
-        # base class's set of method names to the set of required function names for our tasks.
+        # we check here to see if any definition has all of the required methods by looking each
+        # required function name up in the base class's namespace.
+        #
+        # ABCMeta caches the result of this check for each subclass, so it only runs once per class.
         #
-        return any(required_functions.issubset(set(definition.__dict__)) for definition in subclass.__mro__)
+        return any(
+            all(name in definition.__dict__ for name in cls.REQUIRED_FUNCTIONS)
+            for definition in subclass.__mro__)
 
 
 class TaskDef:
@@ -132,20 +199,44 @@ class TaskDef:
         pass
 
 
-def get_current_release() -> Release:
+def get_current_plist() -> dict:
+    """Returns the parsed contents of the current release plist file.
+
+    The parsed contents are cached until the file is modified. A copy is returned so that callers
+    can modify it without affecting the cached value.
+    """
+    mtime = stat(CURRENT_RELEASE_FILENAME).st_mtime_ns
+    return dict(_read_current_plist(CURRENT_RELEASE_FILENAME, mtime))
+
+
+@lru_cache(maxsize=4)
+def _read_current_plist(filename: str, mtime: int) -> dict:
     log = logging.getLogger("release")
-    log.debug(f"parsing current version information from {CURRENT_RELEASE_FILENAME}")
+    log.debug(f"parsing current release plist from {filename}")
 
-    with open(CURRENT_RELEASE_FILENAME, "r", encoding="utf-8") as current_release_file:
-        # instead of loading directly from the file pointer, we load it as text content, strip
-        # the whitespace, adn then re-encode it as bytes.
+    with open(filename, "rb") as current_release_file:
+        # instead of loading directly from the file pointer, we read the raw bytes and strip the
+        # whitespace first.
         #
         # plistlib will fail if there is whitespace at the beginning of the plist file, so this
         # is a less brittle and accounts for times when people may be editing the file by
         # hand.
         current_release_content = current_release_file.read().strip()
 
-    plist = plistlib.loads(current_release_content.encode("utf-8"), fmt=plistlib.FMT_XML)
+    return _loads_plist(current_release_content)
+
+
+def get_current_release(plist: dict = None) -> Release:
+    """Returns the current release from the current release plist file.
+
+    If the plist has already been parsed with get_current_plist, it can be passed in to avoid
+    reading it again.
+    """
+    log = logging.getLogger("release")
+    log.debug(f"parsing current version information from {CURRENT_RELEASE_FILENAME}")
+
+    if plist is None:
+        plist = get_current_plist()
 
     version = plist['CFBundleShortVersionString'].strip()
     name = plist['SLKReleaseName'].strip()
@@ -155,19 +246,99 @@ def get_current_release() -> Release:
     return Release(version, name)
 
 
+def _loads_plist(data: bytes) -> dict:
+    """Parses the content of an XML plist file into a dictionary.
+
+    Uses lxml if it is available and plistlib otherwise. The lxml reader only handles the simple
+    documents that our plist files are; if anything else is encountered (other value types,
+    entities, comments inside values, etc), the content is handed off to plistlib instead so that
+    both readers always agree.
+    """
+    if etree is not None:
+        parser = etree.XMLParser(resolve_entities=False, no_network=True)
+        root = etree.fromstring(data, parser=parser)
+
+        # lxml reports an (empty) internal dtd for any doctype, including the standard apple one,
+        # so we only refuse documents whose internal subset actually declares something
+        #
+        dtd = root.getroottree().docinfo.internalDTD
+
+        try:
+            if root.tag != "plist":
+                raise ValueError(f"unexpected root element: {root.tag}")
+            elif dtd is not None and (any(dtd.iterelements()) or any(dtd.entities())):
+                raise ValueError("plist declares an internal dtd subset")
+
+            return _plist_value(_plist_children(root)[0])
+        except (IndexError, KeyError, TypeError, ValueError):
+            pass
+
+    return plistlib.loads(data, fmt=plistlib.FMT_XML)
+
+
+def _plist_children(element) -> list:
+    # skips over comments and processing instructions, which don't have a string tag
+    #
+    return [child for child in element if isinstance(child.tag, str)]
+
+
+def _plist_text(element) -> str:
+    # element.text stops at the first child node, so anything with children (comments, entity
+    # references, nested elements) is left for plistlib
+    #
+    if len(element) > 0:
+        raise ValueError(f"unexpected child nodes in plist {element.tag}")
+
+    return element.text or ""
+
+
+def _plist_value(element):
+    tag = element.tag
+
+    if tag == "dict":
+        children = _plist_children(element)
+        keys = children[0::2]
+        values = children[1::2]
+
+        if len(keys) != len(values) or any(key.tag != "key" for key in keys):
+            raise ValueError("malformed plist dict")
+
+        return {_plist_text(key): _plist_value(value) for key, value in zip(keys, values)}
+    elif tag == "array":
+        return [_plist_value(child) for child in _plist_children(element)]
+    elif tag == "string":
+        return _plist_text(element)
+    elif tag == "integer":
+        return int(_plist_text(element))
+    elif tag == "real":
+        return float(_plist_text(element))
+    elif tag == "true":
+        return True
+    elif tag == "false":
+        return False
+
+    raise ValueError(f"unsupported plist value type: {tag}")
+
+
 def get_available_releases() -> dict[str, str]:
     """Parses the release information file to get information on which releases are available.
 
-    This is used when determining which release is the "next" or "previous" release.
+    This is used when determining which release is the "next" or "previous" release. Like
+    get_current_plist, the parsed releases are cached until the file is modified.
     """
+    mtime = stat(AVAILABLE_RELEASES_FILENAME).st_mtime_ns
+    return dict(_read_available_releases(AVAILABLE_RELEASES_FILENAME, mtime))
+
+
+@lru_cache(maxsize=4)
+def _read_available_releases(filename: str, mtime: int) -> dict[str, str]:
     log = logging.getLogger("release")
-    log.debug(f"parsing available releases from {AVAILABLE_RELEASES_FILENAME}")
+    log.debug(f"parsing available releases from {filename}")
 
-    # the assumption here is that each version and name must be unique, so these sets are used
-    # to ensure this.
+    # the assumption here is that each version and name must be unique. versions are the keys of
+    # available_releases, so only the names need a separate set to ensure this.
     #
     name_set = set()
-    version_set = set()
     available_releases = dict()
 
     # this loop is mostly about filtering out unusable data. specifically, we ignore:
@@ -177,23 +348,26 @@ def get_available_releases() -> dict[str, str]:
     #   - any line where one or more columns is empty
     #   - any name/version value that is duplicated
     #
-    # if I could do this again, I would have probably just used the csv.DictReader class.
+    # the file only ever has two plain columns, so we split each line ourselves instead of going
+    # through csv.reader, which is a fair bit slower for such a simple format. note that this
+    # means quoted values are not supported.
     #
-    with open(AVAILABLE_RELEASES_FILENAME, "r", encoding="utf-8") as available_releases_file:
-        release_reader = csv.reader(available_releases_file, delimiter=',')
+    with open(filename, "r", encoding="utf-8", buffering=1 << 20) as available_releases_file:
+        for line_number, release in enumerate(available_releases_file, 1):
+            release = release.strip()
 
-        for i, release in enumerate(release_reader):
-            line_number = i + 1
-
-            if (column_count := len(release)) == 0:
+            if len(release) == 0:
                 log.debug(f"ignoring line {line_number}; empty line")
                 continue
-            elif column_count != 2:
-                log.debug(f"ignoring line {line_number}; expected 2 values, got {column_count}: {release}")
+
+            name, separator, version = release.partition(',')
+
+            if not separator or ',' in version:
+                log.debug(f"ignoring line {line_number}; expected 2 values, got {release.count(',') + 1}: {release}")
                 continue
 
-            name = release[0].strip()
-            version = release[1].strip()
+            name = name.strip()
+            version = version.strip()
 
             if len(name) == 0 or len(version) == 0:
                 log.debug(f"ignoring line {line_number}; name and version cannot be empty: {release}")
@@ -210,13 +384,12 @@ def get_available_releases() -> dict[str, str]:
             if name in name_set:
                 log.debug(f"ignoring line {line_number}; duplicate release name: {name}")
                 continue
-            name_set.add(name)
 
-            if version in version_set:
+            if version in available_releases:
                 log.debug(f"ignoring line {line_number}; duplicate release version: {version}")
                 continue
-            version_set.add(name)
 
+            name_set.add(name)
             available_releases[version] = name
 
             log.debug(f"found version {name}/{version}")
@@ -235,13 +408,28 @@ def get_available_releases() -> dict[str, str]:
 #
 
 
+_SEMVER_PATTERN = re.compile(r"\A\d+(?:\.\d+)*\Z")
+
+
 def is_semver(version: str) -> bool:
     """Determines whether or not a value is valid semver (or semver-ish).
 
     Returns True if the value consists only of integers separated by a dot and False if the value
     is anything else.
     """
-    return all(n.isnumeric() for n in version.split('.'))
+    return _SEMVER_PATTERN.match(version) is not None
+
+
+def _semver_key(version: str) -> tuple[int, ...]:
+    """Converts a semver-ish value into a tuple that can be used as a sort key.
+
+    Trailing zeros are dropped so that values like 3.7.0 and 3.7 produce the same key.
+    """
+    parts = [int(n) for n in version.split('.')]
+    while len(parts) > 1 and parts[-1] == 0:
+        parts.pop()
+
+    return tuple(parts)
 
 
 def semver_compare(version1: str, version2: str) -> int:
@@ -253,20 +441,11 @@ def semver_compare(version1: str, version2: str) -> int:
     Returns  0 if version1 is equal to version2.
     Returns  1 if version1 is larger than version2.
     """
-    version1_parts = version1.split('.')
-    version2_parts = version2.split('.')
-
-    # handles comparisons like 3.7.0 to 3.7, which if the zero isn't popped will consider the values
-    # to not be equivalent
+    # the parts are compared as integers (so 1.10 is larger than 1.9), and _semver_key handles
+    # comparisons like 3.7.0 to 3.7, which if the zero isn't dropped will consider the values to
+    # not be equivalent
     #
-    while version1_parts[-1] == 0:
-        version1_parts.pop()
-    while version2_parts[-1] == 0:
-        version2_parts.pop()
-
-    if version1_parts < version2_parts:
-        return -1
-    elif version1_parts > version2_parts:
-        return 1
-    else:
-        return 0
+    version1_parts = _semver_key(version1)
+    version2_parts = _semver_key(version2)
+
+    return (version1_parts > version2_parts) - (version1_parts < version2_parts)
@@ -1,10 +1,24 @@
 import logging
 import sys
 from argparse import ArgumentParser
-from .core import TaskState, get_current_release, get_available_releases
+from .core import TaskState, get_current_plist, get_current_release, get_available_releases
 from .task import get_release_tasks
 
-def run(argv=sys.argv[1:]):
+LOG_LEVELS = {
+    "fatal": logging.CRITICAL,
+    "error": logging.ERROR,
+    "warn": logging.WARNING,
+    "info": logging.INFO,
+    "debug": logging.DEBUG
+}
+
+def run(argv: list[str] = None):
+    # sys.argv is read when run is called rather than when this module is imported, so callers
+    # that set sys.argv after importing the harness get the arguments they expect
+    #
+    if argv is None:
+        argv = sys.argv[1:]
+
     # we parse the log level early here. this is because of two conflicting requirements:
     #
     #   1.  we need to parse the tasks folder in order to determine valid argument values
@@ -12,39 +26,35 @@ def run(argv=sys.argv[1:]):
     #   2.  we want to have logging setup before we parse the tasks folder so that we can
     #       debug any issues with loading tasks.
     #
-    # to accommodate this, we validate the log level first and ignore any other arguments.
-    # once the tasks are loaded, we can then validate the entire set of arguments.
+    # to accommodate this, we scan the arguments for the log level by hand and ignore any other
+    # arguments. an invalid log level is reported right away, before anything is loaded. once the
+    # tasks are loaded, we add the tasks argument to the parser and validate the entire set of
+    # arguments.
     #
+    # abbreviations are disabled so that the scanned log level always agrees with what the parser
+    # accepts, ie: --log=debug is rejected instead of being parsed as the log level.
     #
-    # this messes with the --help argument though, so it's not a perfect solution. another option
-    # would be to queue all log output until the log level is known, then empty the queue after the
-    # log level is specified. 
-    #
-    LOG_LEVELS = {
-        "fatal": logging.CRITICAL,
-        "error": logging.ERROR,
-        "warn": logging.WARNING,
-        "info": logging.INFO,
-        "debug": logging.DEBUG
-    }
-
     parser = ArgumentParser(description="Performs tasks associated with a release.", allow_abbrev=False)
     parser.add_argument("--log-level", choices=LOG_LEVELS.keys(), default="info")
 
-    # discard unknown args for now
-    #
-    args, _ = parser.parse_known_args()
+    log_level = _scan_log_level(argv)
+    if log_level not in LOG_LEVELS:
+        parser.error(
+            f"argument --log-level: invalid choice: '{log_level}' "\
+            f"(choose from {', '.join(map(repr, LOG_LEVELS.keys()))})")
 
     logging.basicConfig(
-        level=LOG_LEVELS[args.log_level],
+        level=LOG_LEVELS[log_level],
         format="[%(asctime)s] %(levelname)-5s %(name)s: %(message)s",
         datefmt="%Y-%m-%d %H:%M:%S")
 
     log = logging.getLogger("release")
+    current_plist = get_current_plist()
     state = TaskState(
         root_logger=log,
-        current_release=get_current_release(),
-        available_releases=get_available_releases())
+        current_release=get_current_release(current_plist),
+        available_releases=get_available_releases(),
+        current_plist=current_plist)
 
     # loads all the tasks from the tasks folder.
     # 
@@ -61,11 +71,9 @@ def run(argv=sys.argv[1:]):
     # 
     #   release.py create-release-branch --branch-prefix=release/
     #
-    parser = ArgumentParser(description="Performs tasks associated with a release.")
     parser.add_argument("--tasks", nargs="+", choices=task_names, default=task_names)
-    parser.add_argument("--log-level", choices=LOG_LEVELS.keys(), default="info")
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     # following is the main portion of the harness that executes release tasks. simply, just run
     # though each task that the user specified on the command line and execute it.
@@ -76,3 +84,22 @@ def run(argv=sys.argv[1:]):
         log.info(f'running task {name}')
         task.run(state)
         log.info(f'successfully completed task {name}')
+
+
+def _scan_log_level(argv: list[str]) -> str:
+    """Finds the value of the --log-level argument without running a full argument parser.
+
+    Handles both the --log-level=debug and --log-level debug forms. If the argument is given more
+    than once, the last value wins, which is the same as argparse.
+    """
+    log_level = "info"
+
+    for i, arg in enumerate(argv):
+        if arg == "--":
+            break
+        elif arg.startswith("--log-level="):
+            log_level = arg.split("=", 1)[1]
+        elif arg == "--log-level" and i + 1 < len(argv):
+            log_level = argv[i + 1]
+
+    return log_level
@@ -1,8 +1,9 @@
 import logging
+from functools import lru_cache
 from glob import glob
 from importlib import import_module
 from inspect import getmembers, isfunction
-from os import path
+from os import path, stat
 from .core import Task, TaskDef, TaskState
 
 def get_release_tasks(state: TaskState) -> dict[str, TaskDef]:
@@ -12,6 +13,8 @@ def get_release_tasks(state: TaskState) -> dict[str, TaskDef]:
     formatted in a specific way in order to be executed.
     
     Review the Task class in the core.py library for more information.
+
+    The loaded tasks are cached until the contents of the tasks/ folder change.
     """
     log = state.root_logger.getChild("task")
 
@@ -23,9 +26,24 @@ def get_release_tasks(state: TaskState) -> dict[str, TaskDef]:
     # we're always trying to read from a directory relative to the task.py file.
     #
     task_dir = path.join(path.dirname(__file__), "tasks")
-    task_pattern = path.join(task_dir, "[!_]*.py")
 
     log.debug(f"tasks directory is {task_dir}")
+
+    # adding, removing or renaming a file in the tasks/ folder updates its modification time, so it
+    # works as the cache key for the loaded tasks
+    #
+    return dict(_load_release_tasks(task_dir, stat(task_dir).st_mtime_ns))
+
+
+@lru_cache(maxsize=1)
+def _load_release_tasks(task_dir: str, mtime: int) -> dict[str, TaskDef]:
+    # the logger is looked up here instead of being passed in so that it isn't part of the cache
+    # key. otherwise a state with a different root logger would evict and reload the tasks.
+    #
+    log = logging.getLogger("release.task")
+
+    task_pattern = path.join(task_dir, "[!_]*.py")
+
     log.debug(f"detecting tasks with glob pattern {task_pattern}")
 
     # this section of code uses importlib to import each task in the tasks folder, where each task
@@ -1,6 +1,5 @@
-import os
 from ..core import TaskState, REPOSITORY_NAME
-from github import Github, GithubException
+from github import GithubException
 
 class Task:
     def run(state: TaskState) -> None:
@@ -9,20 +8,10 @@ class Task:
         log.info(f"creating a new release branch from master")
         log.info(f"current release is {state.current_release.name}/{state.current_release.version}")
 
-        if "GITHUB_ACCESS_TOKEN" not in os.environ:
-            raise RuntimeError(
-                "you must create an access token and assign it to the the GITHUB_ACCESS_TOKEN "\
-                "environment variable")
-
-        access_token = os.getenv("GITHUB_ACCESS_TOKEN")
-        if access_token is None:
-            raise RuntimeError("The GITHUB_ACCESS_TOKEN environment variable must contain a valid Github access token,")
-
         branch_name = f"{state.current_release.name}/{state.current_release.version}"
         log.info(f"branch {branch_name} will be created in repository {REPOSITORY_NAME}")
 
-        g = Github(access_token)
-        repo = g.get_repo(REPOSITORY_NAME)
+        repo = state.repo
 
         # this is more about grabbing the master branch commit than confirming it exists.
         #
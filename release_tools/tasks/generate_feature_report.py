@@ -1,7 +1,53 @@
 import csv
-import os
-from ..core import TaskState, REPOSITORY_NAME
-from github import Github, GithubException
+import io
+import logging
+from ..core import TaskState
+
+FEATURES_FILENAME = "featureflags/FF.csv"
+
+FEATURES_QUERY = """
+query($owner: String!, $name: String!, $current: String!, $previous: String!, $includePrevious: Boolean!) {
+  repository(owner: $owner, name: $name) {
+    current: object(expression: $current) {
+      ... on Blob { text isTruncated }
+    }
+    previous: object(expression: $previous) @include(if: $includePrevious) {
+      ... on Blob { text isTruncated }
+    }
+  }
+}
+"""
+
+_VALID_STATES = frozenset(("ON", "OFF"))
+
+
+def _parse_feature_csv(text: str, log: logging.Logger) -> dict[str, str]:
+    """Parses the contents of a feature flag file into a dictionary of flag names to states.
+    """
+    features = dict()
+
+    # only the first two columns are used, so a plain csv.reader is enough here. it skips the
+    # per-row dictionaries that csv.DictReader would build.
+    #
+    features_reader = csv.reader(io.StringIO(text))
+    for row in features_reader:
+        if not row:
+            continue
+
+        # cleaning the names a bit so we can compare properly to the previous csv's keys. a row
+        # without a state is treated like any other unknown value so that it gets reported.
+        #
+        name = row[0].strip().upper()
+        feature_state = row[1].strip().upper() if len(row) > 1 else ""
+
+        if feature_state not in _VALID_STATES:
+            log.warning(f"unknown value for feature flag {name}")
+            continue
+
+        features[name] = feature_state
+
+    return features
+
 
 class Task:
     def run(state: TaskState) -> None:
@@ -10,89 +56,83 @@ class Task:
         log.info(f"generating a feature flag change report")
         log.info(f"current release is {state.current_release.name}/{state.current_release.version}")
 
-        access_token = os.getenv("GITHUB_ACCESS_TOKEN")
-        if access_token is None:
-            raise RuntimeError("The GITHUB_ACCESS_TOKEN environment variable must contain a valid Github access token,")
+        skip_previous = False
+        try:
+            previous_release = state.previous_release()
+            log.info(f"previous release is {previous_release.name}/{previous_release.version}")
+        except Exception as err:
+            log.warning(f"could not parse previous release from available releases file: {err}")
+            skip_previous = True
+
+        # both versions of the feature flag file are fetched with a single graphql query instead
+        # of a separate rest call for each, which saves a couple of round trips to github
+        #
+        # unhardcode this at some point
+        #
+        previous_branch = "" if skip_previous else f"{previous_release.name}/{previous_release.version}"
 
-        g = Github(access_token)
-        repo = g.get_repo(REPOSITORY_NAME)
+        repository = state.graphql(FEATURES_QUERY, {
+            "current": f"master:{FEATURES_FILENAME}",
+            "previous": f"{previous_branch}:{FEATURES_FILENAME}",
+            "includePrevious": not skip_previous
+        })
 
         # we'll try to build out dictionaries of both current and previous features. if we can't
         # parse the previous features because - for example - a branch doesn't exist, we'll only
         # display the current features
         #
-        features = dict()
         prev_features = dict()
 
-        # unhardcode this at some point
+        # github returns null text for binary blobs and may truncate the text of large files. a
+        # truncated file would silently drop flags from the report, so we never parse partial text.
         #
-        features_file = repo.get_contents("featureflags/FF.csv", ref="master")
-        features_lines = features_file.decoded_content.decode("utf-8").split("\n")
+        current_file = repository.get("current") or {}
+        if current_file.get("text") is None:
+            raise RuntimeError(f"could not read {FEATURES_FILENAME} from the master branch")
+        elif current_file.get("isTruncated"):
+            raise RuntimeError(f"{FEATURES_FILENAME} on the master branch is too large to be read in full")
 
-        features_reader = csv.DictReader(features_lines, fieldnames=("name","state"))
-        for row in features_reader:
-            # cleaning the names a bit so we can compare properly to the previous csv's keys
-            #
-            name = row["name"].strip().upper()
-            feature_state = row["state"].strip().upper()
-
-            if feature_state not in set(["ON", "OFF"]):
-                log.warning(f"unknown value for feature flag {name}")
-                continue
-
-            features[name] = feature_state
-
-        skip_previous = False
-        try:
-            previous_release = state.previous_release()
-            log.info(f"previous release is {previous_release.name}/{previous_release.version}")
-        except Exception as err:
-            log.warning(f"could not parse previous release from available releases file: {err}")
-            skip_previous = True
+        features = _parse_feature_csv(current_file["text"], log)
 
         if not skip_previous:
-            try:
-                features_file = repo.get_contents("featureflags/FF.csv", ref=f"{previous_release.name}/{previous_release.version}")
-                features_lines = features_file.decoded_content.decode("utf-8").split("\n")
-
-                features_reader = csv.DictReader(features_lines, fieldnames=("name","state"))
-                for row in features_reader:
-                    name = row["name"].strip().upper()
-                    feature_state = row["state"].strip().upper()
-                    
-                    if feature_state not in set(["ON", "OFF"]):
-                        log.warning(f"unknown value for feature flag {name}")
-                        continue
-
-                    prev_features[name] = feature_state
-            except GithubException as err:
-                log.warning(f"no previous feature flag data could be read from branch {previous_release.name}/{previous_release.version}")
-
-        prev_features['FLAG_Z'] = 'ON'
+            previous_file = repository.get("previous") or {}
+            if previous_file.get("text") is None:
+                log.warning(f"no previous feature flag data could be read from branch {previous_branch}")
+            elif previous_file.get("isTruncated"):
+                log.warning(
+                    f"{FEATURES_FILENAME} on branch {previous_branch} is too large to be read in full, "\
+                    f"previous feature flag data will not be reported")
+            else:
+                prev_features = _parse_feature_csv(previous_file["text"], log)
 
         # accounting for the case where flags may be added or removed
         #
-        flag_names = set(features.keys()).union(prev_features.keys())
-        flag_names = list(flag_names)
-        flag_names.sort()
+        flag_names = sorted(features.keys() | prev_features.keys())
 
-        report_contents = "flag_name,current_version,previous_version\n"
+        report_rows = ["flag_name,current_version,previous_version"]
 
         log.info("feature flag report")
         log.info("flag\tcur\tprev")
         log.info("-----------------------")
 
+        # the lookups are bound outside of the loop since they run once per flag
+        #
+        features_get = features.get
+        prev_features_get = prev_features.get
+
         for name in flag_names:
-            current_value = features.get(name) or "-"
-            prev_value = prev_features.get(name) or "-"
+            current_value = features_get(name, "-")
+            prev_value = prev_features_get(name, "-")
 
             log.info(f"{name}\t{current_value}\t{prev_value}") 
-            report_contents += f"{name},{current_value},{prev_value}\n"
+            report_rows.append(f"{name},{current_value},{prev_value}")
+
+        report_contents = "\n".join(report_rows) + "\n"
 
         output_file = "out_flags.csv"
         log.info(f"outputting to {output_file}")
 
-        with open(output_file, "w") as out_flags_files:
+        with open(output_file, "w", buffering=1 << 16) as out_flags_files:
             out_flags_files.write(report_contents)
         
         log.info("feature flag report has been generated")
@@ -1,7 +1,20 @@
-import os
 import plistlib
 from ..core import TaskState, CURRENT_RELEASE_FILENAME, REPOSITORY_NAME
-from github import Github, GithubException
+
+# unhardcode this at some point
+#
+RELEASE_FILENAME = "release.plist"
+
+BLOB_SHA_QUERY = """
+query($owner: String!, $name: String!, $expression: String!) {
+  repository(owner: $owner, name: $name) {
+    object(expression: $expression) {
+      ... on Blob { oid }
+    }
+  }
+}
+"""
+
 
 class Task:
     def run(state: TaskState) -> None:
@@ -14,39 +27,39 @@ class Task:
 
         log.info(f"next release is {next_release.name}/{next_release.version}")
 
-        with open(CURRENT_RELEASE_FILENAME, "r", encoding="utf-8") as current_release_file:
-            # see core.py for why we load it like this, the tldr is to account for unexpected
-            # whitespace issues
-            #
-            current_release_content = current_release_file.read().strip()
-            plist = plistlib.loads(current_release_content.encode("utf-8"), fmt=plistlib.FMT_XML)
+        # the harness has already parsed the plist file, so we work from a copy of that instead of
+        # reading the file again
+        #
+        plist = dict(state.current_plist)
 
         plist['SLKReleaseName'] = next_release.name
         plist['CFBundleShortVersionString'] = next_release.version
 
+        # we keep the serialized plist around so that we can commit it to the repo below without
+        # having to read the file back in
+        #
+        current_release_content = plistlib.dumps(plist, fmt=plistlib.FMT_XML, sort_keys=False)
+
         with open(CURRENT_RELEASE_FILENAME, "wb") as current_release_file:
-            plistlib.dump(plist, current_release_file, fmt=plistlib.FMT_XML, sort_keys=False)
+            current_release_file.write(current_release_content)
 
         log.info(f"the current release plist file has been updated with the next release version")
 
-        access_token = os.getenv("GITHUB_ACCESS_TOKEN")
-        if access_token is None:
-            raise RuntimeError("The GITHUB_ACCESS_TOKEN environment variable must contain a valid Github access token,")
-
-        g = Github(access_token)
-        repo = g.get_repo(REPOSITORY_NAME)
-
-        with open(CURRENT_RELEASE_FILENAME, "rb") as current_release_file:
-            current_release_content = current_release_file.read()
-
-        # unhardcode this at some point
+        # updating a file only needs the sha of the existing blob. get_contents would download the
+        # whole file that we're about to overwrite, so we only ask graphql for the sha instead.
         #
-        github_file = repo.get_contents("release.plist")
+        # HEAD resolves to the default branch, which is the branch update_file commits to.
+        #
+        repository = state.graphql(BLOB_SHA_QUERY, {"expression": f"HEAD:{RELEASE_FILENAME}"})
+
+        sha = (repository.get("object") or {}).get("oid")
+        if sha is None:
+            raise RuntimeError(f"could not find {RELEASE_FILENAME} in {REPOSITORY_NAME}")
 
-        repo.update_file(
-            path=github_file.path, 
+        state.repo.update_file(
+            path=RELEASE_FILENAME,
             message=f"Update current release to {next_release.name}/{next_release.version}",
             content=current_release_content,
-            sha=github_file.sha)
+            sha=sha)
 
         log.info("new release file has been committed")